@@ -0,0 +1,146 @@
+from io import StringIO
+
+from core.models import Product
+from django.contrib.auth.models import AnonymousUser
+from django.core.management import call_command
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+
+from vendor.models import CustomerProfile, ProfileProductAccess, Receipt
+
+
+class ProfileProductAccessTests(TestCase):
+
+    fixtures = ["user", "unit_test"]
+
+    def setUp(self):
+        self.customer_profile = CustomerProfile.objects.get(pk=1)
+        self.product = Product.objects.get(pk=2)
+
+    def test_access_built_from_receipts(self):
+        access = ProfileProductAccess.objects.filter(profile=self.customer_profile)
+
+        self.assertEqual(
+            set(access.values_list("receipt", "product")), {(1, 2), (2, 2)}
+        )
+        self.assertEqual(set(access.active().values_list("receipt", flat=True)), {2})
+
+    def test_receipt_save_updates_access(self):
+        receipt = Receipt.objects.get(pk=2)
+        receipt.end_date = timezone.now() - timezone.timedelta(days=1)
+        receipt.save()
+
+        self.assertFalse(
+            ProfileProductAccess.objects.active()
+            .filter(profile=self.customer_profile)
+            .exists()
+        )
+        self.assertFalse(self.customer_profile.has_product(self.product))
+
+    def test_soft_deleted_receipt_keeps_ownership_history(self):
+        Receipt.objects.get(pk=2).delete()
+
+        self.assertFalse(self.customer_profile.has_product(self.product))
+        self.assertTrue(self.customer_profile.has_owned_product(self.product))
+
+    def test_receipt_products_change_updates_access(self):
+        other_product = Product.objects.get(pk=1)
+
+        Receipt.objects.get(pk=2).products.add(other_product)
+        self.assertTrue(self.customer_profile.has_product(other_product))
+
+        other_product.receipts.clear()
+        self.assertFalse(self.customer_profile.has_product(other_product))
+
+    def test_owners_from_access(self):
+        self.assertEqual(self.product.owners(), {self.customer_profile})
+        self.assertEqual(
+            set(self.product.active_profile_receipts().values_list("pk", flat=True)),
+            {2},
+        )
+        self.assertEqual(
+            set(self.product.inactive_profile_receipts().values_list("pk", flat=True)),
+            {1},
+        )
+        self.assertEqual(self.product.expired_owners(), set())
+
+    def test_has_product_single_query(self):
+        with self.assertNumQueries(1):
+            self.assertTrue(self.customer_profile.has_product(self.product))
+
+    def test_rebuild_product_access_command(self):
+        ProfileProductAccess.objects.all().delete()
+
+        call_command("rebuild_product_access", batch_size=2, stdout=StringIO())
+
+        self.assertEqual(ProfileProductAccess.objects.count(), 2)
+        self.assertTrue(self.customer_profile.has_product(self.product))
+
+
+class OwnedProductsTests(TestCase):
+
+    fixtures = ["user", "unit_test"]
+
+    def setUp(self):
+        self.customer_profile = CustomerProfile.objects.get(pk=1)
+        self.products = Product.objects.filter(pk__in=[1, 2, 3])
+
+    def test_owned_product_ids_single_query(self):
+        with self.assertNumQueries(1):
+            owned = self.customer_profile.owned_product_ids(self.products)
+
+        self.assertEqual(owned, {2})
+        self.assertEqual(self.customer_profile.owned_product_ids([1, 3]), set())
+
+    def test_get_products_access(self):
+        receipt = Receipt.objects.get(pk=2)
+        receipt.transaction = "trial-123"
+        receipt.save()
+
+        with self.assertNumQueries(1):
+            products_access = self.customer_profile.get_products_access(self.products)
+
+        self.assertEqual(
+            products_access,
+            {2: {"owned": True, "future_access": False, "trial": True}},
+        )
+
+    def test_get_products_access_future(self):
+        receipt = Receipt.objects.get(pk=1)
+        receipt.start_date = timezone.now() + timezone.timedelta(days=1)
+        receipt.end_date = None
+        receipt.save()
+
+        self.assertTrue(
+            self.customer_profile.get_products_access([2])[2]["future_access"]
+        )
+
+    def test_owned_products_template_tag(self):
+        template = Template(
+            "{% load vendor_tags %}{% owned_products products as owned %}"
+            "{% for product in products %}{% if product.pk in owned %}"
+            "{{ product.pk }}{% endif %}{% endfor %}"
+        )
+        request = RequestFactory().get("/")
+        request.user = self.customer_profile.user
+        request.site = self.customer_profile.site
+
+        rendered = template.render(
+            Context({"request": request, "products": list(self.products)})
+        )
+
+        self.assertEqual(rendered, "2")
+
+    def test_owned_products_template_tag_anonymous(self):
+        template = Template(
+            "{% load vendor_tags %}{% owned_products products as owned %}{{ owned|length }}"
+        )
+        request = RequestFactory().get("/")
+        request.user = AnonymousUser()
+
+        rendered = template.render(
+            Context({"request": request, "products": self.products})
+        )
+
+        self.assertEqual(rendered, "0")
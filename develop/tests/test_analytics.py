@@ -0,0 +1,344 @@
+import datetime
+import math
+from io import StringIO
+from unittest import skipIf
+
+from django.contrib.auth import get_user_model
+from django.contrib.sites.models import Site
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from vendor.analytics import (
+    SubscriptionAnalytics,
+    SubscriptionForecast,
+    add_months,
+    np,
+)
+from vendor.models import (
+    CustomerProfile,
+    Invoice,
+    Offer,
+    OrderItem,
+    Payment,
+    Price,
+    Receipt,
+    Subscription,
+)
+from vendor.models.choice import PurchaseStatus, SubscriptionStatus
+
+User = get_user_model()
+
+
+def get_datetime(year, month, day):
+    return datetime.datetime(year, month, day, 12, tzinfo=datetime.timezone.utc)
+
+
+@skipIf(np is None, "NumPy is not installed, skipping tests")
+class SubscriptionAnalyticsTests(TestCase):
+
+    fixtures = ["user", "unit_test"]
+
+    def setUp(self):
+        self.site = Site.objects.get(pk=1)
+        self.profile = CustomerProfile.objects.get(pk=1)
+        self.order_item = OrderItem.objects.get(pk=4)  # Monthly subscription offer
+        OrderItem.objects.filter(pk=4).update(unit_price=1000)
+
+        # Fixture subscription 1 has one receipt, 2020-10-02 to 2020-11-02
+        self.create_payment(
+            Subscription.objects.get(pk=1), get_datetime(2020, 10, 2), 500
+        )
+
+        churned = self.create_subscription(
+            [
+                (get_datetime(2020, 10, 10), get_datetime(2020, 11, 10)),
+                (get_datetime(2020, 11, 10), get_datetime(2020, 12, 10)),
+                (get_datetime(2020, 12, 10), get_datetime(2021, 1, 10)),
+            ]
+        )
+        for month in [10, 11, 12]:
+            self.create_payment(churned, get_datetime(2020, month, 10), 1000)
+
+        self.create_subscription(
+            [
+                (get_datetime(2020, 11, 5), get_datetime(2020, 11, 20), "trial-1"),
+                (get_datetime(2020, 11, 20), get_datetime(2020, 12, 20)),
+                (get_datetime(2020, 12, 20), get_datetime(2021, 1, 20)),
+                (get_datetime(2021, 1, 20), get_datetime(2021, 4, 20)),
+            ]
+        )
+
+        self.analytics = SubscriptionAnalytics.load(
+            self.site, "usd", today=datetime.date(2021, 3, 15)
+        )
+        self.months = self.analytics.get_months(datetime.date(2020, 10, 1))
+
+    def create_subscription(self, receipts):
+        subscription = Subscription.objects.create(
+            profile=self.profile, gateway_id="analytics"
+        )
+
+        for start_date, end_date, *transaction in receipts:
+            Receipt.objects.create(
+                profile=self.profile,
+                order_item=self.order_item,
+                subscription=subscription,
+                start_date=start_date,
+                end_date=end_date,
+                transaction=transaction[0] if transaction else "analytics",
+            )
+
+        return subscription
+
+    def create_payment(self, subscription, submitted_date, amount):
+        return Payment.objects.create(
+            invoice=Invoice.objects.get(pk=1),
+            profile=self.profile,
+            subscription=subscription,
+            amount=amount,
+            status=PurchaseStatus.SETTLED,
+            submitted_date=submitted_date,
+        )
+
+    def assertMatrixEqual(self, matrix, expected):
+        self.assertEqual(
+            [[None if math.isnan(value) else value for value in row] for row in matrix],
+            expected,
+        )
+
+    def test_months_end_at_today(self):
+        self.assertEqual(
+            [str(month) for month in self.months],
+            ["2020-10", "2020-11", "2020-12", "2021-01", "2021-02", "2021-03"],
+        )
+
+    def test_mrr_and_arr(self):
+        self.assertEqual(
+            self.analytics.get_mrr(self.months).tolist(),
+            [2000, 2000, 2000, 1000, 1000, 1000],
+        )
+        self.assertEqual(self.analytics.get_arr(self.months)[0], 24000)
+
+    def test_active_subscriptions(self):
+        self.assertEqual(
+            self.analytics.get_active_subscriptions(self.months).tolist(),
+            [2, 2, 2, 1, 1, 1],
+        )
+
+    def test_churn(self):
+        active, churned, churn_rate = self.analytics.get_churn(self.months)
+
+        self.assertEqual(active.tolist(), [0, 2, 2, 2, 1, 1])
+        self.assertEqual(churned.tolist(), [0, 1, 0, 1, 0, 0])
+        self.assertTrue(math.isnan(churn_rate[0]))
+        self.assertEqual(churn_rate[1:].tolist(), [0.5, 0, 0.5, 0, 0])
+
+    def test_cohort_retention(self):
+        sizes, retention = self.analytics.get_cohort_retention(self.months, max_age=5)
+
+        self.assertEqual(sizes.tolist(), [2, 1, 0, 0, 0, 0])
+        self.assertMatrixEqual(
+            retention[:2],
+            [[1, 0.5, 0.5, 0, 0, 0], [1, 1, 1, 1, 1, None]],
+        )
+
+    def test_revenue_retention(self):
+        revenue = self.analytics.get_cohort_revenue(self.months, max_age=3)
+        retention = self.analytics.get_revenue_retention(self.months, max_age=3)
+
+        self.assertEqual(revenue[0].tolist(), [1500, 1000, 1000, 0])
+        self.assertMatrixEqual(retention[:1], [[1, 1000 / 1500, 1000 / 1500, 0]])
+
+    def test_missing_unit_price_uses_offer_price(self):
+        OrderItem.objects.filter(pk=4).update(unit_price=None)
+        price = Offer.objects.get(pk=4).current_price("usd")
+
+        analytics = SubscriptionAnalytics.load(
+            self.site, "usd", today=datetime.date(2021, 3, 15)
+        )
+
+        self.assertGreater(price, 0)
+        self.assertEqual(
+            analytics.get_mrr(self.months).tolist(),
+            [2 * price, 2 * price, 2 * price, price, price, price],
+        )
+
+    def test_other_currency_is_left_out(self):
+        analytics = SubscriptionAnalytics.load(
+            self.site, "eur", today=datetime.date(2021, 3, 15)
+        )
+
+        self.assertEqual(analytics.get_mrr(self.months).tolist(), [0] * 6)
+
+    def test_report(self):
+        report = self.analytics.get_report(self.months, max_age=2)
+
+        self.assertEqual(
+            report["months"][1],
+            {
+                "month": datetime.date(2020, 11, 1),
+                "mrr": 2000,
+                "arr": 24000,
+                "subscriptions": 2,
+                "churned": 1,
+                "churn_rate": 0.5,
+            },
+        )
+        self.assertEqual(
+            [cohort["month"] for cohort in report["cohorts"]],
+            [datetime.date(2020, 10, 1), datetime.date(2020, 11, 1)],
+        )
+
+    def test_command(self):
+        out = StringIO()
+        call_command(
+            "subscription_analytics",
+            "--site=1",
+            "--start-date=2020-10-01",
+            "--end-date=2021-03-01",
+            stdout=out,
+        )
+
+        self.assertIn("2020-11\t2000.00\t24000.00\t2\t1\t50.0%", out.getvalue())
+        self.assertIn("Reported 6 months", out.getvalue())
+
+    def test_admin_view(self):
+        client = Client()
+        client.force_login(User.objects.get(pk=1))
+        response = client.get(reverse("vendor_admin:manager-subscription-analytics"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Cohort Retention")
+
+
+@skipIf(np is None, "NumPy is not installed, skipping tests")
+class SubscriptionForecastTests(TestCase):
+
+    fixtures = ["user", "unit_test"]
+
+    def setUp(self):
+        self.site = Site.objects.get(pk=1)
+        self.profile = CustomerProfile.objects.get(pk=1)
+        self.monthly = Offer.objects.get(pk=4)  # 12 payments, the first one is a trial
+        self.limited = Offer.objects.get(pk=5)  # 3 payments
+        self.limited.term_details["trial_occurrences"] = 2
+        self.limited.save()
+        Price.objects.filter(offer=self.limited).update(cost=3000)
+
+        # Billed on the 31st, the trial receipt is the first payment
+        self.create_subscription(
+            OrderItem.objects.get(pk=4),
+            get_datetime(2020, 12, 31),
+            get_datetime(2021, 1, 31),
+            "trial-1",
+        )
+        # Billed on the 1st, two payments left and the next is still a trial
+        self.create_subscription(
+            OrderItem.objects.create(
+                invoice=Invoice.objects.get(pk=1), offer=self.limited
+            ),
+            get_datetime(2021, 1, 1),
+            get_datetime(2021, 2, 1),
+        )
+        # Canceled subscriptions are not billed
+        self.create_subscription(
+            OrderItem.objects.get(pk=4),
+            get_datetime(2021, 1, 5),
+            get_datetime(2021, 2, 5),
+            status=SubscriptionStatus.CANCELED,
+        )
+
+        self.forecast = SubscriptionForecast.load(
+            self.site, months=3, today=datetime.date(2021, 1, 15)
+        )
+
+    def create_subscription(
+        self,
+        order_item,
+        start_date,
+        end_date,
+        transaction="forecast",
+        status=SubscriptionStatus.ACTIVE,
+    ):
+        subscription = Subscription.objects.create(
+            profile=self.profile, gateway_id="forecast", status=status
+        )
+        Receipt.objects.create(
+            profile=self.profile,
+            order_item=order_item,
+            subscription=subscription,
+            start_date=start_date,
+            end_date=end_date,
+            transaction=transaction,
+        )
+
+        return subscription
+
+    def test_add_months_clamps_to_month_end(self):
+        dates = add_months(
+            np.array(["2020-01-31", "2021-01-31"], dtype="M8[D]")[:, None], np.arange(3)
+        )
+
+        self.assertEqual(
+            dates.astype(str).tolist(),
+            [
+                ["2020-01-31", "2020-02-29", "2020-03-31"],
+                ["2021-01-31", "2021-02-28", "2021-03-31"],
+            ],
+        )
+
+    def test_monthly_totals(self):
+        monthly_price = self.monthly.current_price("usd")
+        limited_price = 3000
+
+        self.assertEqual(
+            [
+                (total["period"], total["site"], total["currency"], total["amount"])
+                for total in self.forecast.get_totals("month")
+            ],
+            [
+                (datetime.date(2021, 1, 1), 1, "usd", monthly_price),
+                (datetime.date(2021, 2, 1), 1, "usd", monthly_price + 2520),
+                (datetime.date(2021, 3, 1), 1, "usd", monthly_price + limited_price),
+                (datetime.date(2021, 4, 1), 1, "usd", 0),
+            ],
+        )
+
+    def test_daily_totals(self):
+        totals = {
+            total["period"]: total["amount"]
+            for total in self.forecast.get_totals("day")
+            if total["amount"]
+        }
+
+        self.assertEqual(
+            list(totals),
+            [
+                datetime.date(2021, 1, 31),
+                datetime.date(2021, 2, 1),
+                datetime.date(2021, 2, 28),
+                datetime.date(2021, 3, 1),
+                datetime.date(2021, 3, 31),
+            ],
+        )
+        self.assertEqual(len(self.forecast.get_totals("day")), 90)
+
+    def test_unknown_period(self):
+        with self.assertRaises(ValueError):
+            self.forecast.get_totals("year")
+
+    def test_report_manager(self):
+        self.create_subscription(
+            OrderItem.objects.get(pk=4),
+            timezone.now() - datetime.timedelta(days=20),
+            timezone.now() + datetime.timedelta(days=10),
+        )
+        totals = Subscription.reports.get_revenue_forecast(self.site, months=2)
+
+        self.assertEqual({total["currency"] for total in totals}, {"usd"})
+        self.assertEqual(
+            sum(total["amount"] for total in totals),
+            2 * self.monthly.current_price("usd"),
+        )
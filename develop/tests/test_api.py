@@ -9,7 +9,7 @@ from django.urls import reverse
 from django.utils import timezone
 
 from vendor.forms import DateTimeRangeForm
-from vendor.models import Offer, Payment, Price, Subscription
+from vendor.models import Invoice, Offer, Payment, Price, Subscription
 
 User = get_user_model()
 
@@ -23,6 +23,103 @@ class VendorAPITest(TestCase):
         self.user = User.objects.get(pk=1)
         self.client.force_login(self.user)
 
+    def test_cart_operations(self):
+        response = self.client.post(
+            reverse("vendor_api:cart-operations"),
+            data=json.dumps(
+                {
+                    "operations": [
+                        {"action": "remove", "offer": "mouse-t-shirt", "clear": True},
+                        {
+                            "action": "swap",
+                            "offer": "hulk-mug",
+                            "new_offer": "free-hulk-mug",
+                        },
+                    ]
+                }
+            ),
+            content_type="application/json",
+        )
+        invoice = Invoice.objects.get(pk=1)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            {item["offer"] for item in response.json()["order_items"]},
+            {"wheel-of-wensleydale", "hamster-wheel", "free-hulk-mug"},
+        )
+        self.assertEqual(response.json()["total"], invoice.total)
+        self.assertFalse(invoice.order_items.filter(offer__pk__in=[1, 4]).exists())
+
+    def test_cart_operations_owned_offer(self):
+        response = self.client.post(
+            reverse("vendor_api:cart-operations"),
+            data=json.dumps(
+                {"operations": [{"action": "add", "offer": "wheel-of-wensleydale"}]}
+            ),
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_cart_operations_owned_offer_removed(self):
+        response = self.client.post(
+            reverse("vendor_api:cart-operations"),
+            data=json.dumps(
+                {
+                    "operations": [
+                        {
+                            "action": "set_quantity",
+                            "offer": "wheel-of-wensleydale",
+                            "quantity": 0,
+                        }
+                    ]
+                }
+            ),
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(
+            Invoice.objects.get(pk=1).order_items.filter(offer__pk=2).exists()
+        )
+
+    def test_cart_operations_invalid(self):
+        url = reverse("vendor_api:cart-operations")
+        subtotal = Invoice.objects.get(pk=1).subtotal
+
+        for operations in [
+            [{"action": "add", "offer": "not-an-offer"}],
+            [{"action": "discard", "offer": "hulk-mug"}],
+            [{"action": "swap", "offer": "hulk-mug"}],
+            [{"action": "add", "offer": "hulk-mug", "quantity": "many"}],
+            [{"action": "add", "offer": "hamster-wheel", "quantity": -3}],
+            [{"action": "remove", "offer": "mouse-t-shirt", "quantity": -4}],
+            [{"action": "add", "offer": "hamster-wheel", "quantity": 0}],
+            [{"action": "add", "offer": "hamster-wheel", "quantity": True}],
+            ["x"],
+        ]:
+            response = self.client.post(
+                url,
+                data=json.dumps({"operations": operations}),
+                content_type="application/json",
+            )
+
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("error", response.json())
+
+        self.assertEqual(Invoice.objects.get(pk=1).subtotal, subtotal)
+
+    def test_cart_operations_requires_login(self):
+        self.client.logout()
+
+        response = self.client.post(
+            reverse("vendor_api:cart-operations"),
+            data=json.dumps({"operations": []}),
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 403)
+
     def test_subscription_price_update_success(self):
         subscription = Subscription.objects.get(pk=1)
         offer = Offer.objects.get(pk=4)
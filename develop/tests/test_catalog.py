@@ -0,0 +1,158 @@
+from unittest import mock
+
+from django.contrib.sites.models import Site
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from vendor.catalog import (
+    bump_catalog_version,
+    clear_catalog,
+    get_catalog,
+    get_offer,
+    get_offers,
+)
+from vendor.models import Offer, Price
+from vendor.pricing import price_memo
+
+
+class CatalogDisabledTests(TestCase):
+
+    fixtures = ["user", "unit_test"]
+
+    def setUp(self):
+        self.site = Site.objects.get(pk=1)
+
+    def test_no_catalog_without_cache(self):
+        self.assertIsNone(get_catalog(self.site))
+
+    def test_get_offer_from_database(self):
+        with self.assertNumQueries(1):
+            offer = get_offer(self.site, slug="hulk-mug", available=True)
+
+        self.assertEqual(offer.pk, 4)
+
+    def test_get_offer_deleted(self):
+        Offer.objects.filter(pk=4).update(deleted=True)
+
+        with self.assertRaises(Offer.DoesNotExist):
+            get_offer(self.site, pk=4)
+
+    def test_get_offer_missing(self):
+        with self.assertRaises(Offer.DoesNotExist):
+            get_offer(self.site, slug="not-an-offer")
+
+
+@mock.patch("vendor.cache.VENDOR_CACHE_ALIAS", "default")
+class CatalogSnapshotTests(TestCase):
+
+    fixtures = ["user", "unit_test"]
+
+    def setUp(self):
+        cache.clear()
+        clear_catalog()
+        self.site = Site.objects.get(pk=1)
+
+    def tearDown(self):
+        clear_catalog()
+
+    def test_snapshot_is_reused(self):
+        catalog = get_catalog(self.site)
+
+        with self.assertNumQueries(0):
+            self.assertIs(get_catalog(self.site), catalog)
+            offer = get_offer(self.site, slug="hulk-mug", available=True)
+            self.assertEqual(offer.get_msrp(), 2520)
+            self.assertEqual(len(offer.products.all()), 1)
+
+    def test_get_offer_returns_copy(self):
+        offer = get_offer(self.site, pk=4)
+        offer.name = "Changed"
+
+        self.assertEqual(get_offer(self.site, pk=4).name, Offer.objects.get(pk=4).name)
+
+    def test_copy_has_own_prefetch_cache(self):
+        offer = get_offer(self.site, pk=4)
+        offer.products.all()._result_cache.clear()
+        offer._prefetched_objects_cache.clear()
+
+        self.assertEqual(len(get_offer(self.site, pk=4).products.all()), 1)
+
+    def test_deleted_offers_left_out(self):
+        Offer.objects.filter(pk=4).update(deleted=True)
+        bump_catalog_version()
+
+        with self.assertRaises(Offer.DoesNotExist):
+            get_offer(self.site, pk=4)
+        self.assertEqual(set(get_offers(self.site, [3, 4])), {3})
+
+    def test_get_offer_unavailable(self):
+        Offer.objects.filter(pk=4).update(available=False)
+        bump_catalog_version()
+
+        with self.assertRaises(Offer.DoesNotExist):
+            get_offer(self.site, slug="hulk-mug", available=True)
+
+    def test_get_offers_loads_missing_from_database(self):
+        other_site = Site.objects.create(domain="other.example.com", name="Other")
+        other_offer = Offer.objects.create(
+            name="Other", site=other_site, start_date=timezone.now()
+        )
+
+        offers = get_offers(self.site, ["3", str(other_offer.pk)])
+
+        self.assertEqual(set(offers), {3, other_offer.pk})
+
+    def test_price_save_rebuilds_snapshot(self):
+        catalog = get_catalog(self.site)
+
+        Price.objects.create(
+            offer_id=3,
+            cost=100,
+            start_date=timezone.now() - timezone.timedelta(days=1),
+            priority=10,
+        )
+
+        self.assertIsNot(get_catalog(self.site), catalog)
+        with price_memo():
+            self.assertEqual(get_offer(self.site, pk=3).current_price(), 100)
+
+    def test_snapshot_resolves_prices_for_request(self):
+        get_catalog(self.site)
+
+        with price_memo():
+            offer = get_offer(self.site, pk=3)
+
+            with self.assertNumQueries(0):
+                self.assertEqual(offer.current_price(), 2520)
+
+    def test_scheduled_price_from_timeline(self):
+        sale_start = timezone.now() + timezone.timedelta(hours=1)
+        Price.objects.create(offer_id=3, cost=100, start_date=sale_start, priority=10)
+        catalog = get_catalog(self.site)
+        offer = catalog.get_offer(pk=3)
+
+        later = sale_start + timezone.timedelta(minutes=1)
+        self.assertEqual(catalog.get_current_prices([offer])[3].cost, 2520)
+        self.assertEqual(catalog.get_current_prices([offer], at=later)[3].cost, 100)
+
+    def test_product_offers_change_rebuilds_snapshot(self):
+        catalog = get_catalog(self.site)
+
+        Offer.objects.get(pk=4).products.clear()
+
+        self.assertIsNot(get_catalog(self.site), catalog)
+        self.assertEqual(get_offer(self.site, pk=4).get_msrp(), 0)
+
+    def test_session_cart_through_snapshot(self):
+        client = Client()
+        client.post(reverse("vendor_api:add-to-cart", kwargs={"slug": "hulk-mug"}))
+        client.post(reverse("vendor_api:add-to-cart", kwargs={"slug": "hamster-wheel"}))
+
+        response = client.get(reverse("vendor:cart"))
+
+        self.assertEqual(
+            response.context["invoice"]["subtotal"],
+            Offer.objects.get(pk=4).get_msrp() + Offer.objects.get(pk=3).get_msrp(),
+        )
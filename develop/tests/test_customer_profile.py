@@ -1,12 +1,23 @@
+from unittest import mock
+
 from core.models import Product
 from django.contrib.auth.models import User
 from django.contrib.sites.models import Site
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
 from django.test import Client, TestCase
 from django.urls import reverse
 from django.utils import timezone
 
+from vendor.cart import get_cart_badge_cache_key
+from vendor.entitlements import Entitlements, get_entitlements_cache_key
 from vendor.models import CustomerProfile, Invoice, Offer, Price, Receipt
 from vendor.models.choice import InvoiceStatus, TermType
+from vendor.models.invoice import (
+    EMPTY_CART_COUNTERS,
+    OPEN_CART_STATUSES,
+    collapse_open_carts,
+)
 
 
 class ModelCustomerProfileTests(TestCase):
@@ -101,16 +112,43 @@ class ModelCustomerProfileTests(TestCase):
         self.assertEqual(cart.status, InvoiceStatus.CART)
 
     def test_gets_checkout_cart(self):
-        self.customer_profile_existing.invoices.add(
-            Invoice.objects.create(
-                status=InvoiceStatus.CHECKOUT, profile=self.customer_profile_existing
-            )
-        )
+        invoice = Invoice.objects.get(pk=1)
+        invoice.status = InvoiceStatus.CHECKOUT
+        invoice.save()
 
         cart = self.customer_profile_existing.get_cart_or_checkout_cart()
 
         self.assertEqual(cart.status, InvoiceStatus.CHECKOUT)
 
+    def test_gets_cart_in_one_query(self):
+        with self.assertNumQueries(1):
+            cart = self.customer_profile_existing.get_cart_or_checkout_cart()
+
+        self.assertEqual(cart.pk, 1)
+
+    def test_creates_cart_on_profile_site(self):
+        cart = self.customer_profile.get_cart_or_checkout_cart()
+
+        self.assertEqual(cart.status, InvoiceStatus.CART)
+        self.assertEqual(cart.site, self.customer_profile.site)
+        self.assertEqual(self.customer_profile.get_cart_or_checkout_cart(), cart)
+
+    def test_cart_created_concurrently_is_returned(self):
+        existing_cart = Invoice.objects.get(pk=1)
+
+        with mock.patch.object(
+            CustomerProfile, "get_open_cart", side_effect=[None, existing_cart]
+        ):
+            cart = self.customer_profile_existing.get_cart_or_checkout_cart()
+
+        self.assertEqual(cart, existing_cart)
+        self.assertEqual(
+            1,
+            self.customer_profile_existing.invoices.filter(
+                status__in=OPEN_CART_STATUSES, deleted=False
+            ).count(),
+        )
+
     def test_get_cart_items_count(self):
         invoice = Invoice.objects.get(pk=1)
         self.assertEqual(
@@ -223,28 +261,186 @@ class ModelCustomerProfileTests(TestCase):
         self.assertEqual(product_offer[0][0], Product.objects.get(pk=2))
         self.assertEqual(product_offer[0][1], Offer.objects.get(pk=2))
 
-    def test_get_checkout_invoice_success(self):
+    def test_get_active_products_skips_receipts_without_products(self):
+        receipt = Receipt.objects.get(pk=2)
+        receipt.products.clear()
+        profile = self.customer_profile_existing
+
+        # The products can go between the receipt and products queries.
+        with mock.patch.object(
+            CustomerProfile,
+            "get_active_receipts",
+            lambda profile: profile.receipts.filter(pk=receipt.pk),
+        ):
+            self.assertEqual(profile.get_active_products(), set())
+            self.assertEqual(profile.get_active_product_and_offer(), [])
+
+    def test_second_open_cart_rejected(self):
         invoice_invalid_cart = Invoice()
-        invoice_invalid_cart.status = InvoiceStatus.CART
+        invoice_invalid_cart.status = InvoiceStatus.CHECKOUT
         invoice_invalid_cart.profile = self.customer_profile_existing
-        invoice_invalid_cart.save()
 
-        invoice = (  # noqa F841
-            self.customer_profile_existing.get_cart_or_checkout_cart()
-        )
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            invoice_invalid_cart.save()
+
+        Invoice.objects.filter(pk=1).update(status=InvoiceStatus.COMPLETE)
+        invoice_invalid_cart.save()
 
         self.assertEqual(
-            1,
-            self.customer_profile_existing.invoices.filter(
-                status=InvoiceStatus.CART, deleted=False
-            ).count(),
+            self.customer_profile_existing.get_cart_or_checkout_cart(),
+            invoice_invalid_cart,
         )
 
+    def test_collapse_open_carts_without_duplicates(self):
+        self.assertEqual(collapse_open_carts(Invoice.objects.all()), 0)
+        self.assertFalse(Invoice.objects.get(pk=1).deleted)
+
     def test_next_billing_date(self):
         # TODO: Finish this test
         pass
 
 
+@mock.patch("vendor.cache.VENDOR_CACHE_ALIAS", "default")
+class EntitlementCacheTests(TestCase):
+
+    fixtures = ["user", "unit_test"]
+
+    def setUp(self):
+        cache.clear()
+        self.customer_profile = CustomerProfile.objects.get(pk=1)
+        self.product = Product.objects.get(pk=2)
+        self.cache_key = get_entitlements_cache_key(
+            self.customer_profile.user_id, self.customer_profile.site_id
+        )
+
+    def test_entitlements_match_receipts(self):
+        entitlements = Entitlements.load(1, 1)
+
+        self.assertEqual(entitlements.get_owned_product_ids(), {2})
+        self.assertFalse(entitlements.has_future_access(self.product))
+
+    def test_entitlements_load_required_products(self):
+        entitlements = Entitlements.load(1, 1, [1])
+
+        self.assertEqual(entitlements.grants, [])
+        self.assertEqual(Entitlements.load(1, 1, [2]).get_owned_product_ids(), {2})
+
+    def test_has_product_uses_cache(self):
+        other_product = Product.objects.get(pk=1)
+        self.assertTrue(self.customer_profile.has_product(self.product))
+
+        with self.assertNumQueries(0):
+            self.assertTrue(self.customer_profile.has_product(self.product))
+            self.assertFalse(self.customer_profile.has_future_access([self.product]))
+            self.assertFalse(self.customer_profile.has_product(other_product))
+
+    def test_filter_product_receipts_skips_unowned(self):
+        self.customer_profile.has_product(self.product)
+
+        with self.assertNumQueries(0):
+            self.assertFalse(
+                self.customer_profile.filter_product_receipts([1]).exists()
+            )
+
+        self.assertEqual(self.customer_profile.filter_product_receipts([2]).count(), 1)
+
+    def test_receipt_save_clears_cache(self):
+        self.assertTrue(self.customer_profile.has_product(self.product))
+
+        receipt = Receipt.objects.get(pk=2)
+        receipt.end_date = timezone.now() - timezone.timedelta(days=1)
+        receipt.save()
+
+        self.assertIsNone(cache.get(self.cache_key))
+        self.assertFalse(self.customer_profile.has_product(self.product))
+
+    def test_product_receipts_change_clears_cache(self):
+        self.assertFalse(self.customer_profile.has_product(Product.objects.get(pk=1)))
+
+        Product.objects.get(pk=1).receipts.add(Receipt.objects.get(pk=2))
+
+        self.assertTrue(self.customer_profile.has_product(Product.objects.get(pk=1)))
+
+    def test_cache_expires_when_receipt_ends(self):
+        now = timezone.now()
+        receipt = Receipt.objects.get(pk=2)
+        receipt.end_date = now + timezone.timedelta(minutes=30)
+        receipt.save()
+
+        with mock.patch.object(cache, "set") as cache_set:
+            with mock.patch("vendor.entitlements.timezone.now", return_value=now):
+                self.customer_profile.has_product(self.product)
+
+        self.assertEqual(cache_set.call_args.args[2], 1800)
+
+    def test_product_access_view(self):
+        client = Client()
+        client.force_login(self.customer_profile.user)
+        url = reverse("product-access", kwargs={"slug": "wheel-of-wensleydale"})
+
+        self.assertEqual(client.get(url).status_code, 200)
+
+        Receipt.objects.get(pk=2).delete()
+
+        self.assertEqual(client.get(url).status_code, 302)
+
+
+@mock.patch("vendor.cache.VENDOR_CACHE_ALIAS", "default")
+class CartBadgeTests(TestCase):
+
+    fixtures = ["user", "unit_test"]
+
+    def setUp(self):
+        cache.clear()
+        self.customer_profile = CustomerProfile.objects.get(pk=1)
+        self.cache_key = get_cart_badge_cache_key(
+            self.customer_profile.user_id, self.customer_profile.site_id
+        )
+
+    def test_badge_matches_cart(self):
+        with self.assertNumQueries(1):
+            badge = self.customer_profile.get_cart_badge()
+
+        self.assertEqual(
+            badge,
+            {
+                "item_count": 4,
+                "quantity_total": 8,
+                "has_recurring": True,
+                "has_promo": False,
+            },
+        )
+
+    def test_badge_uses_cache(self):
+        self.customer_profile.get_cart_badge()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.customer_profile.get_cart_items_count(), 4)
+
+    def test_badge_without_cart(self):
+        customer_profile = CustomerProfile.objects.create(user=User.objects.get(pk=2))
+
+        self.assertEqual(customer_profile.get_cart_badge(), EMPTY_CART_COUNTERS)
+        self.assertFalse(customer_profile.invoices.exists())
+
+    def test_cart_change_clears_cache(self):
+        self.customer_profile.get_cart_badge()
+
+        Invoice.objects.get(pk=1).remove_offer(Offer.objects.get(pk=4), clear=True)
+
+        self.assertIsNone(cache.get(self.cache_key))
+        badge = self.customer_profile.get_cart_badge()
+        self.assertEqual(badge["item_count"], 3)
+        self.assertFalse(badge["has_recurring"])
+
+    def test_totals_save_keeps_cache(self):
+        self.customer_profile.get_cart_badge()
+
+        Invoice.objects.get(pk=1).refresh_totals()
+
+        self.assertIsNotNone(cache.get(self.cache_key))
+
+
 class AddOfferToProfileView(TestCase):
 
     fixtures = ["user", "unit_test"]
@@ -1,13 +1,36 @@
+import threading
+from io import StringIO
+from unittest import mock
+
 from django.contrib.auth import get_user_model
 from django.contrib.sites.models import Site
-from django.test import Client, TestCase
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.functional import Promise
 
 from vendor.forms import BillingAddressForm, CreditCardForm
-from vendor.models import CustomerProfile, Invoice, Offer, OrderItem, Payment, Price
+from vendor.models import (
+    CustomerProfile,
+    Invoice,
+    Offer,
+    OrderItem,
+    Payment,
+    Price,
+    Receipt,
+)
 from vendor.models.choice import InvoiceStatus
-from vendor.utils import get_display_decimal
+from vendor.models.invoice import (
+    EMPTY_CART_COUNTERS,
+    INVOICE_SUMMARY_VERSION,
+    convert_session_cart_to_invoice,
+    update_cart_counters,
+)
+from vendor.pricing import InvoicePricing
+from vendor.utils import get_display_decimal, get_future_date_months
 
 User = get_user_model()
 
@@ -37,7 +60,10 @@ class ModelInvoiceTests(TestCase):
     def setUp(self):
         self.existing_invoice = Invoice.objects.get(pk=1)
 
-        self.new_invoice = Invoice(profile=CustomerProfile.objects.get(pk=1))
+        # Profiles only have one open cart, the new invoice gets a second profile of the user.
+        self.new_invoice = Invoice(
+            profile=CustomerProfile.objects.create(user=User.objects.get(pk=1))
+        )
         self.new_invoice.save()
 
         self.shirt_offer = Offer.objects.get(pk=1)
@@ -46,7 +72,8 @@ class ModelInvoiceTests(TestCase):
 
     def test_default_site_id_saved(self):
         invoice = Invoice()
-        invoice.profile = CustomerProfile.objects.get(pk=1)
+        invoice.profile = self.new_invoice.profile
+        invoice.status = InvoiceStatus.COMPLETE
         invoice.save()
 
         self.assertEqual(Site.objects.get_current(), invoice.site)
@@ -233,6 +260,150 @@ class ModelInvoiceTests(TestCase):
         )
         self.assertTrue(self.new_invoice.order_items.filter(offer=hulk_offer).exists())
 
+    def test_apply_cart_operations(self):
+        self.new_invoice.add_offer(self.shirt_offer)
+
+        order_items = self.new_invoice.apply_cart_operations(
+            [
+                {"action": "add", "offer": self.hamster},
+                {"action": "add", "offer": self.mug_offer},
+                {
+                    "action": "swap",
+                    "offer": self.mug_offer,
+                    "new_offer": Offer.objects.get(pk=5),
+                },
+                {"action": "set_quantity", "offer": self.shirt_offer, "quantity": 0},
+            ]
+        )
+
+        self.assertEqual(set(order_items), {3, 5})
+        self.assertEqual(
+            set(self.new_invoice.order_items.values_list("offer", flat=True)), {3, 5}
+        )
+        self.assertEqual(
+            self.new_invoice.subtotal,
+            self.new_invoice.get_pricing(refresh=True).subtotal,
+        )
+
+    def test_apply_cart_operations_quantities(self):
+        self.shirt_offer.allow_multiple = True
+        self.shirt_offer.save()
+
+        self.new_invoice.apply_cart_operations(
+            [
+                {"action": "add", "offer": self.shirt_offer, "quantity": 3},
+                {"action": "remove", "offer": self.shirt_offer},
+                {"action": "add", "offer": self.hamster, "quantity": 3},
+                {"action": "set_quantity", "offer": self.mug_offer, "quantity": 5},
+            ]
+        )
+
+        self.assertEqual(
+            dict(self.new_invoice.order_items.values_list("offer", "quantity")),
+            {1: 2, 3: 1, 4: 1},
+        )
+
+    def test_apply_cart_operations_query_count_does_not_grow(self):
+        invoice = Invoice.objects.get(pk=self.new_invoice.pk)
+
+        with CaptureQueriesContext(connection) as one_operation:
+            invoice.apply_cart_operations([{"action": "add", "offer": self.hamster}])
+
+        invoice.empty_cart()
+        invoice = Invoice.objects.get(pk=self.new_invoice.pk)
+        offers = list(Offer.objects.all())
+
+        with CaptureQueriesContext(connection) as many_operations:
+            invoice.apply_cart_operations(
+                [{"action": "add", "offer": offer} for offer in offers]
+            )
+
+        self.assertEqual(invoice.order_items.count(), len(offers))
+        self.assertEqual(len(one_operation), len(many_operations))
+
+    def test_apply_cart_operations_unknown_action(self):
+        with self.assertRaises(ValueError):
+            self.existing_invoice.apply_cart_operations(
+                [
+                    {"action": "remove", "offer": self.shirt_offer, "clear": True},
+                    {"action": "discard", "offer": self.hamster},
+                ]
+            )
+
+        self.assertTrue(
+            self.existing_invoice.order_items.filter(offer=self.shirt_offer).exists()
+        )
+
+    def test_apply_cart_operations_invalid_operations(self):
+        quantities = dict(
+            self.existing_invoice.order_items.values_list("offer", "quantity")
+        )
+
+        for operation in [
+            {"action": "add", "offer": self.hamster, "quantity": -3},
+            {"action": "remove", "offer": self.shirt_offer, "quantity": -4},
+            {"action": "add", "offer": self.hamster, "quantity": 0},
+            {"action": "add", "offer": self.hamster, "quantity": True},
+            {"action": "set_quantity", "offer": self.hamster, "quantity": -1},
+            "add",
+        ]:
+            with self.assertRaises(ValueError):
+                self.existing_invoice.apply_cart_operations([operation])
+
+        self.assertEqual(
+            dict(self.existing_invoice.order_items.values_list("offer", "quantity")),
+            quantities,
+        )
+
+    def test_apply_cart_operations_clears_promos_left_alone(self):
+        promo_offer = Offer.objects.get(pk=8)
+        promo_offer.is_promotional = True
+        promo_offer.save()
+
+        self.new_invoice.apply_cart_operations(
+            [
+                {"action": "add", "offer": self.hamster},
+                {"action": "add", "offer": promo_offer},
+            ]
+        )
+        self.new_invoice.apply_cart_operations(
+            [{"action": "remove", "offer": self.hamster}]
+        )
+
+        self.assertFalse(self.new_invoice.order_items.exists())
+
+    def test_apply_cart_operations_swap_clears_promos_left_alone(self):
+        promo_offer = Offer.objects.get(pk=8)
+        promo_offer.is_promotional = True
+        promo_offer.save()
+        free_hulk_offer = Offer.objects.get(pk=5)
+
+        self.new_invoice.apply_cart_operations(
+            [
+                {"action": "add", "offer": self.mug_offer},
+                {"action": "add", "offer": promo_offer},
+            ]
+        )
+        self.new_invoice.apply_cart_operations(
+            [{"action": "swap", "offer": self.mug_offer, "new_offer": free_hulk_offer}]
+        )
+
+        self.assertEqual(
+            list(self.new_invoice.order_items.values_list("offer", flat=True)), [5]
+        )
+
+    def test_add_offer_quantity(self):
+        self.shirt_offer.allow_multiple = True
+        self.shirt_offer.save()
+
+        order_item = self.new_invoice.add_offer(self.shirt_offer, quantity=3)
+        self.new_invoice.add_offer(self.hamster, quantity=3)
+
+        self.assertEqual(order_item.quantity, 3)
+        self.assertEqual(
+            self.new_invoice.order_items.get(offer=self.hamster).quantity, 1
+        )
+
     def test_invoice_no_discounts(self):
         self.new_invoice.add_offer(Offer.objects.get(pk=3))
         self.assertEqual(self.new_invoice.get_discounts(), 0)
@@ -390,10 +561,87 @@ class ModelInvoiceTests(TestCase):
         self.assertEqual(invoice_count_before_deletion, Invoice.objects.all().count())
 
     def test_get_next_billing_date_month(self):
-        pass
+        now = timezone.now()
+        self.new_invoice.add_offer(Offer.objects.get(pk=6))
+
+        schedule = self.new_invoice.get_billing_schedule(now)
+
+        self.assertEqual(schedule.next_billing_date, get_future_date_months(now, 1))
+        self.assertEqual(
+            self.new_invoice.get_next_billing_date().date(),
+            get_future_date_months(now, 1).date(),
+        )
 
     def test_get_next_billing_price(self):
-        pass
+        self.new_invoice.add_offer(self.hamster)
+        self.new_invoice.add_offer(Offer.objects.get(pk=6))
+        order_item = self.new_invoice.order_items.get(offer=6)
+
+        self.assertEqual(self.new_invoice.get_next_billing_price(), order_item.total)
+
+    def test_order_item_unique_per_offer(self):
+        with self.assertRaises(IntegrityError):
+            OrderItem.objects.create(invoice=self.existing_invoice, offer=self.hamster)
+
+    def test_with_pricing_uses_prefetched_order_items(self):
+        promo_offer = Offer.objects.get(pk=8)
+        promo_offer.is_promotional = True
+        promo_offer.save()
+        self.existing_invoice.add_offer(promo_offer)
+        subtotal = Invoice.objects.get(pk=1).get_pricing().subtotal
+
+        invoice = Invoice.objects.with_pricing().get(pk=1)
+
+        # Only the current prices and the owned products are left to load
+        with self.assertNumQueries(2):
+            self.assertEqual(invoice.get_pricing().subtotal, subtotal)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(invoice.get_coupon_code_order_item().offer, promo_offer)
+            [order_item.trial_amount for order_item in invoice.order_items.all()]
+
+    def test_with_pricing_refreshed_after_cart_changes(self):
+        invoice = Invoice.objects.with_pricing().get(pk=1)
+        invoice.get_pricing()
+
+        invoice.add_offer(Offer.objects.get(pk=6))
+
+        self.assertIn(6, [line.offer.pk for line in invoice.get_pricing().lines])
+        self.assertEqual(invoice.order_items.count(), 5)
+
+    def test_get_billing_dates_and_prices_trial_offset(self):
+        now = timezone.now()
+        trial_offer = Offer.objects.get(pk=4)
+        self.new_invoice.add_offer(self.hamster)
+        self.new_invoice.add_offer(trial_offer)
+
+        payments = self.new_invoice.get_billing_schedule(now).payments
+
+        self.assertEqual(
+            payments,
+            {
+                now: self.new_invoice.get_one_time_transaction_total(),
+                trial_offer.get_payment_start_date_trial_offset(now): (
+                    self.new_invoice.order_items.get(offer=trial_offer).total
+                ),
+            },
+        )
+
+    def test_get_billing_dates_and_prices_queries_do_not_grow_with_items(self):
+        self.new_invoice.add_offer(Offer.objects.get(pk=4))
+        self.new_invoice.clear_pricing()
+
+        with CaptureQueriesContext(connection) as one_item:
+            self.new_invoice.get_billing_dates_and_prices()
+
+        self.new_invoice.add_offer(Offer.objects.get(pk=6))
+        self.new_invoice.add_offer(Offer.objects.get(pk=7))
+        self.new_invoice.clear_pricing()
+
+        with CaptureQueriesContext(connection) as three_items:
+            self.new_invoice.get_billing_dates_and_prices()
+
+        self.assertEqual(len(three_items), len(one_item))
 
     def test_clear_promos_when_last_item_is_removed(self):
         promo_offer = Offer.objects.get(pk=8)
@@ -432,6 +680,586 @@ class ModelInvoiceTests(TestCase):
         )
 
 
+class InvoicePricingTests(TestCase):
+
+    fixtures = ["user", "unit_test"]
+
+    def setUp(self):
+        self.existing_invoice = Invoice.objects.get(pk=1)
+
+    def test_pricing_matches_order_item_properties(self):
+        pricing = InvoicePricing(self.existing_invoice)
+
+        for line in pricing.lines:
+            order_item = OrderItem.objects.get(pk=line.order_item.pk)
+            self.assertEqual(line.price, order_item.price)
+            self.assertEqual(line.total, order_item.total)
+            self.assertEqual(line.discounts, order_item.discounts)
+            self.assertEqual(line.trial_amount, order_item.trial_amount)
+
+    def test_pricing_subtotal_matches_order_items(self):
+        subtotal = sum(
+            [
+                order_item.total
+                for order_item in OrderItem.objects.filter(
+                    invoice=self.existing_invoice, offer__is_promotional=False
+                )
+            ]
+        )
+
+        self.assertEqual(InvoicePricing(self.existing_invoice).subtotal, subtotal)
+
+    def test_pricing_skips_owned_product_discounts(self):
+        wheel_offer = Offer.objects.get(pk=3)
+        wheel_price = Price.objects.get(pk=5)
+        wheel_price.cost = wheel_offer.get_msrp() - 10
+        wheel_price.save()
+        self.existing_invoice.delete()
+        invoice = Invoice.objects.create(profile=self.existing_invoice.profile)
+        invoice.add_offer(wheel_offer)
+
+        self.assertEqual(InvoicePricing(invoice).discounts, 10)
+
+        order_item = self.existing_invoice.order_items.get(offer=wheel_offer)
+        receipt = Receipt.objects.create(profile=invoice.profile, order_item=order_item)
+        receipt.products.add(*wheel_offer.products.all())
+
+        self.assertEqual(InvoicePricing(invoice).discounts, 0)
+
+    def test_update_totals_query_count_does_not_grow_with_cart(self):
+        self.existing_invoice.delete()
+        invoice = Invoice.objects.create(profile=self.existing_invoice.profile)
+        invoice.add_offer(Offer.objects.get(pk=3))
+        invoice = Invoice.objects.select_related("profile").get(pk=invoice.pk)
+
+        with CaptureQueriesContext(connection) as single_item:
+            invoice.update_totals()
+
+        for offer in Offer.objects.exclude(pk=3):
+            invoice.add_offer(offer)
+        invoice = Invoice.objects.select_related("profile").get(pk=invoice.pk)
+
+        with CaptureQueriesContext(connection) as full_cart:
+            invoice.update_totals()
+
+        self.assertGreater(invoice.order_items.count(), 1)
+        self.assertEqual(len(single_item), len(full_cart))
+
+    def test_cached_pricing_cleared_on_cart_change(self):
+        self.existing_invoice.delete()
+        invoice = Invoice.objects.create(profile=self.existing_invoice.profile)
+        invoice.add_offer(Offer.objects.get(pk=3))
+        subtotal = invoice.calculate_subtotal()
+
+        invoice.add_offer(Offer.objects.get(pk=6))
+
+        self.assertGreater(invoice.calculate_subtotal(), subtotal)
+
+
+class OrderItemPriceSnapshotTests(TestCase):
+
+    fixtures = ["user", "unit_test"]
+
+    def setUp(self):
+        self.invoice = Invoice.objects.create(
+            profile=CustomerProfile.objects.create(user=User.objects.get(pk=1))
+        )
+        self.offer = Offer.objects.get(pk=3)
+        self.invoice.add_offer(self.offer)
+        self.invoice.refresh_totals()
+
+    def test_snapshot_saved_with_totals(self):
+        order_item = OrderItem.objects.get(invoice=self.invoice, offer=self.offer)
+        live_item = OrderItem(offer=self.offer, quantity=order_item.quantity)
+
+        with self.assertNumQueries(0):
+            price = order_item.price
+            total = order_item.total
+            discounts = order_item.discounts
+            trial_amount = order_item.trial_amount
+
+        self.assertEqual(price, live_item.price)
+        self.assertEqual(total, live_item.total)
+        self.assertEqual(discounts, live_item.discounts)
+        self.assertEqual(trial_amount, self.offer.current_price())
+        self.assertEqual(order_item.unit_msrp, self.offer.get_msrp())
+        self.assertEqual(order_item.currency, "usd")
+
+    def test_snapshot_updated_when_cart_is_repriced(self):
+        Price.objects.filter(offer=self.offer).update(cost=100)
+
+        self.invoice.update_totals()
+        self.invoice.save()
+
+        order_item = OrderItem.objects.get(invoice=self.invoice, offer=self.offer)
+        self.assertEqual(order_item.unit_discount, self.offer.get_msrp() - 100)
+
+    def test_snapshot_frozen_after_checkout(self):
+        order_item = OrderItem.objects.get(invoice=self.invoice, offer=self.offer)
+        self.invoice.status = InvoiceStatus.COMPLETE
+        self.invoice.save()
+        Price.objects.filter(offer=self.offer).update(cost=100)
+
+        self.invoice.update_totals()
+        self.invoice.save()
+
+        self.assertEqual(
+            OrderItem.objects.get(pk=order_item.pk).unit_discount,
+            order_item.unit_discount,
+        )
+
+    def test_snapshot_keeps_fractional_prices(self):
+        Price.objects.filter(offer=self.offer).delete()
+        Offer.objects.filter(pk=self.offer.pk).update(
+            allow_multiple=True, msrp_totals={"usd": 19.99}
+        )
+        OrderItem.objects.filter(invoice=self.invoice).update(quantity=4)
+
+        self.invoice.update_totals()
+        self.invoice.save()
+
+        order_item = OrderItem.objects.get(invoice=self.invoice, offer=self.offer)
+        self.assertEqual(order_item.unit_price, 19.99)
+        self.assertEqual(order_item.unit_msrp, 19.99)
+        self.assertAlmostEqual(order_item.total, 79.96)
+
+    def test_missing_snapshot_filled_after_checkout(self):
+        OrderItem.objects.filter(invoice=self.invoice).update(unit_price=None)
+        self.invoice.status = InvoiceStatus.COMPLETE
+
+        self.invoice.update_totals()
+        self.invoice.save()
+
+        self.assertIsNotNone(
+            OrderItem.objects.get(invoice=self.invoice, offer=self.offer).unit_price
+        )
+
+
+class InvoiceLazyTotalsTests(TestCase):
+
+    fixtures = ["user", "unit_test"]
+
+    def setUp(self):
+        self.invoice = Invoice.objects.create(
+            profile=CustomerProfile.objects.create(user=User.objects.get(pk=1))
+        )
+        self.offer = Offer.objects.get(pk=3)
+
+    def test_cart_changes_mark_totals_dirty(self):
+        with mock.patch.object(Invoice, "update_totals") as update_totals:
+            self.invoice.add_offer(self.offer)
+            self.invoice.add_offer(Offer.objects.get(pk=6))
+            self.invoice.remove_offer(Offer.objects.get(pk=6))
+
+        update_totals.assert_not_called()
+        self.assertTrue(
+            Invoice.objects.filter(pk=self.invoice.pk, totals_dirty=True).exists()
+        )
+
+    def test_totals_recalculated_on_read(self):
+        self.invoice.add_offer(self.offer)
+        expected = Invoice.objects.get(pk=self.invoice.pk)
+        expected.update_totals()
+        invoice = Invoice.objects.get(pk=self.invoice.pk)
+
+        self.assertEqual(invoice.total, expected.total)
+        self.assertEqual(invoice.subtotal, expected.subtotal)
+        self.assertFalse(invoice.totals_dirty)
+        self.assertTrue(
+            Invoice.objects.filter(pk=self.invoice.pk, totals_dirty=True).exists()
+        )
+
+        invoice.save()
+
+        stored = Invoice.objects.get(pk=self.invoice.pk)
+        self.assertFalse(stored.totals_dirty)
+        self.assertEqual(stored.__dict__["total"], invoice.total)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(invoice.total, stored.total)
+
+    def test_totals_read_without_writing(self):
+        self.invoice.add_offer(self.offer)
+        invoice = Invoice.objects.get(pk=self.invoice.pk)
+
+        with CaptureQueriesContext(connection) as queries:
+            invoice.total
+
+        self.assertFalse(
+            any(
+                query["sql"].startswith(("UPDATE", "INSERT"))
+                for query in queries.captured_queries
+            )
+        )
+
+    def test_recalculated_totals_saved_with_update_fields(self):
+        self.invoice.add_offer(self.offer)
+        invoice = Invoice.objects.get(pk=self.invoice.pk)
+        total = invoice.total
+
+        invoice.save(update_fields=["status"])
+
+        stored = Invoice.objects.get(pk=self.invoice.pk)
+        self.assertFalse(stored.totals_dirty)
+        self.assertEqual(stored.__dict__["total"], total)
+        self.assertIsNotNone(stored.order_items.get().unit_price)
+
+    def test_totals_recalculated_once_for_several_changes(self):
+        self.invoice.add_offer(self.offer)
+        self.invoice.add_offer(Offer.objects.get(pk=6))
+
+        with mock.patch.object(
+            Invoice, "update_totals", autospec=True, side_effect=Invoice.update_totals
+        ) as update_totals:
+            self.invoice.total
+            self.invoice.subtotal
+
+        self.assertEqual(update_totals.call_count, 1)
+
+    def test_totals_recalculated_on_save(self):
+        self.invoice.add_offer(self.offer)
+        expected = Invoice.objects.get(pk=self.invoice.pk)
+        expected.update_totals()
+        self.invoice.status = InvoiceStatus.CHECKOUT
+        self.invoice.save()
+
+        stored = Invoice.objects.get(pk=self.invoice.pk)
+        self.assertFalse(stored.totals_dirty)
+        self.assertEqual(stored.__dict__["total"], expected.total)
+
+    def test_completed_invoice_totals_kept(self):
+        self.invoice.add_offer(self.offer)
+        charged = self.invoice.total
+        self.invoice.status = InvoiceStatus.COMPLETE
+        self.invoice.save()
+        Price.objects.filter(offer=self.offer).update(cost=1)
+
+        invoice = Invoice.objects.get(pk=self.invoice.pk)
+        invoice.mark_totals_dirty()
+        invoice.save()
+
+        stored = Invoice.objects.get(pk=self.invoice.pk)
+        self.assertFalse(stored.totals_dirty)
+        self.assertEqual(stored.total, charged)
+
+    def test_completed_invoice_not_recalculated_on_read(self):
+        self.invoice.add_offer(self.offer)
+        self.invoice.total
+        self.invoice.status = InvoiceStatus.COMPLETE
+        self.invoice.save()
+        Invoice.objects.filter(pk=self.invoice.pk).update(totals_dirty=True)
+        invoice = Invoice.objects.get(pk=self.invoice.pk)
+
+        with mock.patch.object(Invoice, "update_totals") as update_totals:
+            invoice.total
+            invoice.subtotal
+            invoice.save()
+
+        update_totals.assert_not_called()
+
+    def test_new_completed_invoice_priced(self):
+        invoice = Invoice.objects.create(
+            profile=self.invoice.profile, status=InvoiceStatus.COMPLETE
+        )
+        invoice.add_offer(self.offer)
+        invoice.save()
+        self.invoice.add_offer(self.offer)
+
+        stored = Invoice.objects.get(pk=invoice.pk)
+        self.assertFalse(stored.totals_dirty)
+        self.assertEqual(stored.total, self.invoice.total)
+
+    def test_new_completed_invoice_with_total_priced(self):
+        # Renewals are created completed with the settled amount, then given the offer
+        invoice = Invoice.objects.create(
+            profile=self.invoice.profile, status=InvoiceStatus.COMPLETE, total=500
+        )
+        invoice.add_offer(self.offer)
+        invoice.save()
+        self.invoice.add_offer(self.offer)
+
+        stored = Invoice.objects.get(pk=invoice.pk)
+        self.assertEqual(stored.subtotal, self.invoice.subtotal)
+        self.assertEqual(stored.total, self.invoice.total)
+        self.assertIsNotNone(stored.order_items.get().unit_price)
+
+    def test_loading_totals_keeps_dirty(self):
+        self.invoice.add_offer(self.offer)
+
+        invoice = Invoice.objects.get(pk=self.invoice.pk)
+        self.assertTrue(invoice.__dict__["totals_dirty"])
+
+        invoice = Invoice.objects.defer("subtotal", "total").get(pk=self.invoice.pk)
+        invoice.refresh_from_db(fields=["total"])
+        self.assertTrue(invoice.__dict__["totals_dirty"])
+
+    def test_assigning_total_keeps_dirty(self):
+        self.invoice.add_offer(self.offer)
+
+        self.invoice.total = 500
+
+        self.assertTrue(self.invoice.totals_dirty)
+
+
+class CartCountersTests(TestCase):
+
+    fixtures = ["user", "unit_test"]
+
+    def setUp(self):
+        self.invoice = Invoice.objects.create(
+            profile=CustomerProfile.objects.create(user=User.objects.get(pk=1))
+        )
+        Offer.objects.filter(pk=2).update(allow_multiple=True)
+        Offer.objects.filter(pk=3).update(is_promotional=True)
+
+    def assertCounters(self, **counters):
+        stored = Invoice.objects.filter(pk=self.invoice.pk).values(*counters).get()
+        self.assertEqual(stored, counters)
+        for field, value in counters.items():
+            self.assertEqual(getattr(self.invoice, field), value)
+
+    def test_counters_follow_cart_changes(self):
+        self.invoice.add_offer(Offer.objects.get(pk=2))
+        self.invoice.add_offer(Offer.objects.get(pk=2))
+        self.assertCounters(item_count=1, quantity_total=2, has_recurring=False)
+
+        self.invoice.add_offer(Offer.objects.get(pk=4))
+        self.assertCounters(item_count=2, quantity_total=3, has_recurring=True)
+
+        self.invoice.add_offer(Offer.objects.get(pk=3))
+        self.assertCounters(item_count=3, has_promo=True)
+
+        self.invoice.apply_cart_operations(
+            [
+                {"action": "remove", "offer": Offer.objects.get(pk=4), "clear": True},
+                {
+                    "action": "set_quantity",
+                    "offer": Offer.objects.get(pk=2),
+                    "quantity": 5,
+                },
+            ]
+        )
+        self.assertCounters(item_count=2, quantity_total=6, has_recurring=False)
+
+        self.invoice.empty_cart()
+        self.assertCounters(**EMPTY_CART_COUNTERS)
+
+    def test_update_cart_counters(self):
+        Invoice.objects.filter(pk=1).update(item_count=0, quantity_total=0)
+
+        self.assertEqual(update_cart_counters(Invoice.objects.all()), 1)
+
+        self.assertEqual(
+            Invoice.objects.filter(pk=1).values("item_count", "quantity_total").get(),
+            {"item_count": 4, "quantity_total": 8},
+        )
+
+
+class InvoiceSummaryTests(TestCase):
+
+    fixtures = ["user", "unit_test"]
+
+    def setUp(self):
+        self.invoice = Invoice.objects.create(
+            profile=CustomerProfile.objects.create(user=User.objects.get(pk=1))
+        )
+        self.invoice.add_offer(Offer.objects.get(pk=3))
+        self.invoice.add_offer(Offer.objects.get(pk=6))
+        self.invoice.status = InvoiceStatus.COMPLETE
+
+    def test_summary_saved_on_completion(self):
+        recurring_total = self.invoice.get_recurring_total()
+        one_time_total = self.invoice.get_one_time_transaction_total()
+        next_billing_price = self.invoice.get_next_billing_price()
+        products = self.invoice.get_products()
+        billed = sum(self.invoice.get_billing_dates_and_prices().values())
+
+        self.invoice.save_discounts_vendor_notes()
+
+        invoice = Invoice.objects.get(pk=self.invoice.pk)
+        self.assertEqual(invoice.summary["version"], INVOICE_SUMMARY_VERSION)
+        self.assertEqual(len(invoice.summary["lines"]), 2)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(invoice.get_recurring_total(), recurring_total)
+            self.assertEqual(invoice.get_one_time_transaction_total(), one_time_total)
+            self.assertEqual(invoice.get_next_billing_price(), next_billing_price)
+            self.assertIsNotNone(invoice.get_next_billing_date())
+            self.assertEqual(
+                sum(invoice.get_billing_dates_and_prices().values()), billed
+            )
+
+        self.assertCountEqual(invoice.get_products(), products)
+
+    def test_summary_ignored_on_cart(self):
+        self.invoice.save_summary()
+        self.invoice.summary["recurring_total"] = -1
+        self.invoice.status = InvoiceStatus.CART
+
+        self.assertNotEqual(self.invoice.get_recurring_total(), -1)
+
+    def test_summary_ignored_on_older_version(self):
+        self.invoice.save_summary()
+        self.invoice.summary.update({"version": 0, "recurring_total": -1})
+
+        self.assertIsNone(self.invoice.get_summary())
+        self.assertNotEqual(self.invoice.get_recurring_total(), -1)
+
+    def test_backfill_command_summarizes_completed_invoices(self):
+        self.invoice.save()
+        cart = Invoice.objects.get(pk=1)
+        stale = Invoice.objects.filter(
+            status=InvoiceStatus.COMPLETE, deleted=False
+        ).exclude(pk=self.invoice.pk)
+        stale.update(summary={"version": 0})
+
+        call_command("update_invoice_summary", stdout=StringIO())
+
+        self.assertIsNone(Invoice.objects.get(pk=cart.pk).summary)
+        self.assertIsNotNone(Invoice.objects.get(pk=self.invoice.pk).get_summary())
+        for invoice in Invoice.objects.filter(pk__in=stale.values("pk")):
+            self.assertIsNotNone(invoice.get_summary())
+
+
+class ConcurrentCartTests(TransactionTestCase):
+    """
+    Runs cart changes from parallel workers, each with its own database connection, against
+    the same cart.
+    """
+
+    fixtures = ["user", "unit_test"]
+    workers = 8
+
+    def setUp(self):
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            self.skipTest("In memory SQLite databases share one connection")
+
+        self.offer = Offer.objects.get(pk=3)
+        self.offer.allow_multiple = True
+        self.offer.save()
+
+    def run_workers(self, work):
+        barrier = threading.Barrier(self.workers)
+        errors = []
+
+        def run():
+            try:
+                barrier.wait()
+                work(Invoice.objects.get(pk=1))
+            except Exception as error:  # Reported by the test below
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+
+    def test_concurrent_adds_are_not_lost(self):
+        quantity = OrderItem.objects.get(invoice=1, offer=self.offer).quantity
+
+        self.run_workers(lambda invoice: invoice.add_offer(self.offer))
+
+        order_items = OrderItem.objects.filter(invoice=1, offer=self.offer)
+        self.assertEqual([item.quantity for item in order_items], [quantity + 8])
+
+    def test_concurrent_adds_of_a_new_offer_create_one_order_item(self):
+        offer = Offer.objects.get(pk=6)
+
+        self.run_workers(lambda invoice: invoice.add_offer(offer))
+
+        self.assertEqual(OrderItem.objects.filter(invoice=1, offer=offer).count(), 1)
+
+    def test_concurrent_removes_are_not_lost(self):
+        OrderItem.objects.filter(invoice=1, offer=self.offer).update(quantity=10)
+
+        self.run_workers(lambda invoice: invoice.remove_offer(self.offer))
+
+        self.assertEqual(OrderItem.objects.get(invoice=1, offer=self.offer).quantity, 2)
+
+    def test_totals_match_order_items_after_concurrent_changes(self):
+        self.run_workers(
+            lambda invoice: invoice.apply_cart_operations(
+                [{"action": "add", "offer": self.offer, "quantity": 2}]
+            )
+        )
+
+        invoice = Invoice.objects.get(pk=1)
+        subtotal = invoice.subtotal
+        invoice.update_totals()
+        self.assertEqual(subtotal, invoice.subtotal)
+
+
+class SessionCartMergeTests(TestCase):
+
+    fixtures = ["user", "unit_test"]
+
+    def setUp(self):
+        self.request = RequestFactory().get("/")
+        self.request.session = {}
+        self.request.site = Site.objects.get(pk=1)
+        self.request.user = User.objects.get(pk=1)
+        self.cart = Invoice.objects.get(pk=1)
+
+    def test_session_cart_merged_into_cart(self):
+        hamster = Offer.objects.get(pk=3)
+        hamster.allow_multiple = True
+        hamster.save()
+        quantity = self.cart.order_items.get(offer=hamster).quantity
+        self.request.session["session_cart"] = {
+            "3": {"quantity": 2},
+            "6": {"quantity": 1},
+        }
+
+        convert_session_cart_to_invoice(sender=None, request=self.request)
+        self.cart.refresh_from_db()
+
+        self.assertNotIn("session_cart", self.request.session)
+        self.assertEqual(
+            self.cart.order_items.get(offer=hamster).quantity, quantity + 2
+        )
+        self.assertTrue(self.cart.order_items.filter(offer=6).exists())
+        self.assertEqual(
+            self.cart.subtotal, self.cart.get_pricing(refresh=True).subtotal
+        )
+
+    def test_session_cart_skips_unknown_and_unavailable_offers(self):
+        Offer.objects.filter(pk=6).update(available=False)
+        item_count = self.cart.order_items.count()
+        self.request.session["session_cart"] = {
+            "6": {"quantity": 1},
+            "999": {"quantity": 1},
+            "not-an-offer": {"quantity": 1},
+        }
+
+        convert_session_cart_to_invoice(sender=None, request=self.request)
+
+        self.assertEqual(self.cart.order_items.count(), item_count)
+        self.assertNotIn("session_cart", self.request.session)
+
+    def test_session_cart_query_count_does_not_grow(self):
+        self.request.session["session_cart"] = {"6": {"quantity": 1}}
+
+        with CaptureQueriesContext(connection) as one_offer:
+            convert_session_cart_to_invoice(sender=None, request=self.request)
+
+        self.cart.order_items.all().delete()
+        self.request.session["session_cart"] = {
+            str(pk): {"quantity": 1}
+            for pk in Offer.objects.values_list("pk", flat=True)
+        }
+
+        with CaptureQueriesContext(connection) as all_offers:
+            convert_session_cart_to_invoice(sender=None, request=self.request)
+
+        self.assertEqual(self.cart.order_items.count(), Offer.objects.count())
+        self.assertEqual(len(one_offer), len(all_offers))
+
+
 class CartViewTests(TestCase):
 
     fixtures = ["user", "unit_test"]
@@ -502,6 +1330,72 @@ class CartViewTests(TestCase):
     # raise NotImplementedError()
 
 
+class AnonymousCartViewTests(TestCase):
+
+    fixtures = ["user", "unit_test"]
+
+    def setUp(self):
+        self.client = Client()
+        self.cart_url = reverse("vendor:cart")
+
+    def set_session_cart(self, session_cart):
+        session = self.client.session
+        session["session_cart"] = session_cart
+        session.save()
+
+    def test_session_cart_totals(self):
+        self.set_session_cart({"3": {"quantity": 2}, "4": {"quantity": 1}})
+
+        response = self.client.get(self.cart_url)
+
+        order_items = response.context["order_items"]
+        subtotal = (
+            2 * Offer.objects.get(pk=3).get_msrp() + Offer.objects.get(pk=4).get_msrp()
+        )
+        self.assertEqual(
+            [item.name for item in order_items],
+            [Offer.objects.get(pk=3).name, Offer.objects.get(pk=4).name],
+        )
+        self.assertEqual(response.context["invoice"]["subtotal"], subtotal)
+        self.assertEqual(response.context["invoice"]["total"], subtotal)
+        self.assertFalse(hasattr(order_items[0], "__dict__"))
+
+    def test_session_cart_uses_price_without_msrp(self):
+        self.set_session_cart({"8": {"quantity": 1}})
+        offer = Offer.objects.get(pk=8)
+
+        response = self.client.get(self.cart_url)
+
+        self.assertEqual(response.context["invoice"]["subtotal"], offer.current_price())
+
+    def test_session_cart_skips_missing_offers(self):
+        self.set_session_cart({"3": {"quantity": 1}, "999": {"quantity": 1}})
+
+        response = self.client.get(self.cart_url)
+
+        self.assertEqual(len(response.context["order_items"]), 1)
+
+    def test_session_cart_query_count_does_not_grow(self):
+        Site.objects.get_current()  # Cache the current site for both requests
+        self.set_session_cart({"3": {"quantity": 1}})
+
+        with CaptureQueriesContext(connection) as one_offer:
+            self.client.get(self.cart_url)
+
+        self.set_session_cart(
+            {
+                str(pk): {"quantity": 1}
+                for pk in Offer.objects.values_list("pk", flat=True)
+            }
+        )
+
+        with CaptureQueriesContext(connection) as all_offers:
+            response = self.client.get(self.cart_url)
+
+        self.assertEqual(len(response.context["order_items"]), Offer.objects.count())
+        self.assertEqual(len(one_offer), len(all_offers))
+
+
 class AccountInformationViewTests(TestCase):
 
     fixtures = ["user", "unit_test"]
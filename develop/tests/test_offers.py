@@ -1,14 +1,17 @@
 from datetime import timedelta
+from io import StringIO
 
 from core.models import Product
 from django.contrib.auth import get_user_model
 from django.contrib.sites.models import Site
+from django.core.management import call_command
 from django.test import Client, TestCase
 from django.urls import reverse
 from django.utils import timezone
 
 from vendor.models import Offer
 from vendor.models.choice import TermDetailUnits
+from vendor.pricing import update_offers_msrp
 from vendor.utils import (
     get_display_decimal,
     get_future_date_days,
@@ -297,6 +300,102 @@ class ModelOfferTests(TestCase):
         self.assertFalse(offer.has_any_discount_or_trial())
 
 
+class OfferMSRPTests(TestCase):
+
+    fixtures = ["user", "unit_test"]
+
+    def setUp(self):
+        update_offers_msrp(Offer.objects.all())
+        self.offer = Offer.objects.get(pk=4)
+
+    def test_stored_msrp_matches_products(self):
+        for offer in Offer.objects.all():
+            stored = (offer.get_msrp("usd"), offer.get_best_currency("mxn"))
+            offer.msrp_totals, offer.msrp_currencies = None, None
+
+            self.assertEqual(
+                stored, (offer.get_msrp("usd"), offer.get_best_currency("mxn"))
+            )
+
+    def test_stored_msrp_skips_product_queries(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(self.offer.get_msrp("mxn"), 2112)
+            self.assertEqual(self.offer.get_best_currency("jpy"), "usd")
+
+    def test_adding_product_to_offer_updates_msrp(self):
+        self.offer.products.add(Product.objects.get(pk=1))
+
+        self.assertEqual(self.offer.get_msrp(), 2520 + 999)
+        self.assertEqual(Offer.objects.get(pk=4).get_msrp(), 2520 + 999)
+
+    def test_adding_offer_to_product_updates_msrp(self):
+        Product.objects.get(pk=1).offers.add(self.offer)
+
+        self.assertEqual(Offer.objects.get(pk=4).msrp_totals["usd"], 2520 + 999)
+
+    def test_clearing_product_offers_updates_msrp(self):
+        Product.objects.get(pk=4).offers.clear()
+
+        self.assertEqual(Offer.objects.get(pk=4).msrp_totals, {})
+        self.assertEqual(Offer.objects.get(pk=4).get_msrp(), 0)
+
+    def test_product_meta_save_updates_msrp(self):
+        product = Product.objects.get(pk=4)
+        product.meta["msrp"]["usd"] = 3000
+        product.save()
+
+        self.assertEqual(Offer.objects.get(pk=4).get_msrp("usd"), 3000)
+        self.assertEqual(Offer.objects.get(pk=5).get_msrp("usd"), 3000)
+
+    def test_product_delete_updates_msrp(self):
+        Product.objects.filter(pk=4).delete()
+
+        self.assertEqual(Offer.objects.get(pk=4).msrp_totals, {})
+
+    def test_update_offer_msrp_command(self):
+        Offer.objects.update(msrp_totals=None, msrp_currencies=None)
+
+        call_command("update_offer_msrp", batch_size=3, stdout=StringIO())
+
+        self.assertFalse(Offer.objects.filter(msrp_totals=None).exists())
+        self.assertEqual(
+            Offer.objects.get(pk=4).msrp_totals, {"mxn": 2112, "usd": 2520}
+        )
+
+
+class OfferPrefetchTests(TestCase):
+
+    fixtures = ["user", "unit_test"]
+
+    def test_with_catalog_skips_product_and_price_queries(self):
+        Offer.objects.update(msrp_totals=None, msrp_currencies=None)
+        expected = [
+            (offer.get_msrp(), offer.current_price(), offer.description)
+            for offer in Offer.objects.order_by("pk")
+        ]
+        offers = list(Offer.objects.order_by("pk").with_catalog())
+
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                [
+                    (offer.get_msrp(), offer.current_price(), offer.description)
+                    for offer in offers
+                ],
+                expected,
+            )
+
+    def test_product_current_offer_uses_prefetched_offers(self):
+        products = list(Product.objects.order_by("pk").prefetch_related("offers"))
+        expected = [
+            product.get_current_offer() for product in Product.objects.order_by("pk")
+        ]
+
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                [product.get_current_offer() for product in products], expected
+            )
+
+
 class ViewOfferTests(TestCase):
 
     fixtures = ["user", "unit_test"]
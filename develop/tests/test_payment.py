@@ -1,8 +1,28 @@
+import datetime
+from io import StringIO
+from unittest import mock
+
 from django.contrib.auth import get_user_model
+from django.contrib.sites.models import Site
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Sum
 from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 
-from vendor.models import Invoice, Payment, Receipt
+from vendor.models import (
+    CustomerProfile,
+    Invoice,
+    OrderItem,
+    Payment,
+    PaymentDailyRollup,
+    Receipt,
+    Subscription,
+)
+from vendor.models.choice import PurchaseStatus
+from vendor.models.rollup import PaymentDailyRollupQuerySet
 
 User = get_user_model()
 
@@ -93,3 +113,279 @@ class PaymentViewTests(TestCase):
 
         self.assertEqual(response.status_code, 302)
         self.assertIn("login", response.url)
+
+
+class PaymentReportTests(TestCase):
+
+    fixtures = ["user", "unit_test"]
+
+    def setUp(self):
+        self.site = Site.objects.get(pk=1)
+        Payment.objects.filter(pk=3).update(status=PurchaseStatus.SETTLED)
+        self.subscription = Subscription.objects.create(
+            gateway_id="no-receipts", profile=CustomerProfile.objects.get(pk=1)
+        )
+        Payment.objects.create(
+            invoice=Invoice.objects.get(pk=1),
+            profile=CustomerProfile.objects.get(pk=1),
+            subscription=self.subscription,
+            amount=100,
+            status=PurchaseStatus.SETTLED,
+            submitted_date=timezone.now(),
+        )
+
+    def test_totals_by_subscription_in_one_query(self):
+        with self.assertNumQueries(1):
+            totals = Payment.reports.get_total_settled_purchases_by_subscription(
+                self.site
+            )
+
+        self.assertEqual(
+            totals, {"Hulk Mug Subscription": 40843, str(self.subscription.uuid): 100}
+        )
+
+    def test_totals_by_site_and_subscription(self):
+        with self.assertNumQueries(1):
+            totals = (
+                Payment.reports.get_total_settled_purchases_by_site_and_subscription()
+            )
+
+        self.assertEqual(
+            totals,
+            {1: {"Hulk Mug Subscription": 40843, str(self.subscription.uuid): 100}},
+        )
+
+    def test_single_date_bound_filters(self):
+        start_date = timezone.now() - timezone.timedelta(days=1)
+
+        self.assertEqual(
+            Payment.reports.get_total_settled_purchases_by_subscription(
+                self.site, start_date=start_date
+            ),
+            {str(self.subscription.uuid): 100},
+        )
+        self.assertEqual(
+            Payment.reports.get_total_settled_purchases_by_site(
+                self.site, end_date=start_date
+            ),
+            40843 * 3,
+        )
+
+    def test_totals_by_currency_and_offer(self):
+        totals = Payment.reports.get_settled_purchase_totals(
+            self.site, group_by=["currency", "offer"]
+        )
+
+        self.assertCountEqual(
+            totals,
+            [
+                {
+                    "currency": "usd",
+                    "offer": 4,
+                    "offer_name": "Hulk Mug Subscription",
+                    "amount": 40843,
+                },
+                {"currency": "usd", "offer": None, "offer_name": None, "amount": 81786},
+            ],
+        )
+
+    def test_unknown_group_raises(self):
+        with self.assertRaises(ValueError):
+            Payment.reports.get_settled_purchase_totals(group_by=["product"])
+
+
+class PaymentRollupTests(TestCase):
+
+    fixtures = ["user", "unit_test"]
+
+    def setUp(self):
+        self.site = Site.objects.get(pk=1)
+        self.profile = CustomerProfile.objects.get(pk=1)
+        call_command("rebuild_payment_rollups", stdout=StringIO())
+
+    def create_payment(self, **kwargs):
+        return Payment.objects.create(
+            invoice=Invoice.objects.get(pk=1),
+            profile=self.profile,
+            amount=100,
+            status=PurchaseStatus.SETTLED,
+            submitted_date=timezone.now(),
+            **kwargs,
+        )
+
+    def get_rollup_totals(self, **filters):
+        return PaymentDailyRollup.objects.filter(**filters).aggregate(
+            amount=Sum("amount"),
+            payment_count=Sum("payment_count"),
+            refund_amount=Sum("refund_amount"),
+        )
+
+    def test_rebuild_matches_payments(self):
+        totals = Payment.reports.get_settled_totals_by_period(self.site, "year")
+
+        self.assertEqual(
+            totals,
+            [
+                {
+                    "period": datetime.date(2020, 1, 1),
+                    "currency": "usd",
+                    "amount": 81686,
+                    "payment_count": 2,
+                    "refund_amount": 0,
+                }
+            ],
+        )
+        self.assertEqual(
+            Payment.reports.get_total_settled_purchases_by_site(self.site), 81686
+        )
+
+    def test_rebuild_is_resumable(self):
+        call_command("rebuild_payment_rollups", "--resume", stdout=StringIO())
+        call_command(
+            "rebuild_payment_rollups", "--start-date", "2020-06-30", stdout=StringIO()
+        )
+
+        self.assertEqual(
+            self.get_rollup_totals(status=PurchaseStatus.SETTLED)["payment_count"], 2
+        )
+
+    def test_payment_changes_update_rollups(self):
+        today = timezone.localdate()
+        payment = self.create_payment()
+        self.assertEqual(
+            self.get_rollup_totals(date=today, status=PurchaseStatus.SETTLED),
+            {"amount": 100, "payment_count": 1, "refund_amount": 0},
+        )
+
+        payment.amount = 150
+        payment.save()
+        self.assertEqual(
+            self.get_rollup_totals(date=today, status=PurchaseStatus.SETTLED)["amount"],
+            150,
+        )
+
+        payment.record_refund(50)
+        self.assertEqual(
+            self.get_rollup_totals(date=today, status=PurchaseStatus.SETTLED)["amount"],
+            0,
+        )
+        self.assertEqual(
+            self.get_rollup_totals(date=today, status=PurchaseStatus.REFUNDED),
+            {"amount": 150, "payment_count": 1, "refund_amount": 50},
+        )
+
+        Payment.objects.filter(pk=payment.pk).delete()
+        self.assertFalse(
+            PaymentDailyRollup.objects.filter(date=today).exclude(amount=0).exists()
+        )
+
+    def test_unchanged_payment_skips_rollups(self):
+        payment = Payment.objects.get(pk=self.create_payment().pk)
+        payment.transaction = "unchanged"
+
+        with mock.patch(
+            "vendor.signals.rollup_signals.get_rollup_entries"
+        ) as get_rollup_entries:
+            payment.save()
+
+        get_rollup_entries.assert_not_called()
+
+    def test_loaded_payment_changes_update_rollups(self):
+        today = timezone.localdate()
+        payment = Payment.objects.get(pk=self.create_payment().pk)
+
+        payment.record_refund(40)
+        payment = Payment.objects.get(pk=payment.pk)
+        payment.record_refund(10)
+
+        self.assertEqual(
+            self.get_rollup_totals(date=today, status=PurchaseStatus.REFUNDED),
+            {"amount": 100, "payment_count": 1, "refund_amount": 50},
+        )
+
+    def test_rollup_key_is_unique(self):
+        key = {
+            "site": self.site,
+            "date": None,
+            "offer": None,
+            "currency": "usd",
+            "status": PurchaseStatus.SETTLED,
+        }
+        PaymentDailyRollup.objects.create(**key)
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            PaymentDailyRollup.objects.create(**key)
+
+    def test_add_entries_adds_to_row_created_concurrently(self):
+        today = timezone.localdate()
+        key = (self.site.pk, today, None, "usd", PurchaseStatus.SETTLED)
+        PaymentDailyRollup.objects.add_entries({key: [100, 1, 0]})
+        add_to_row = PaymentDailyRollupQuerySet.add_to_row
+        calls = []
+
+        def add_to_row_after_race(queryset, *args):
+            # The first update runs before the concurrent save created the row
+            calls.append(args)
+            return 0 if len(calls) == 1 else add_to_row(queryset, *args)
+
+        with mock.patch.object(
+            PaymentDailyRollupQuerySet,
+            "add_to_row",
+            autospec=True,
+            side_effect=add_to_row_after_race,
+        ):
+            PaymentDailyRollup.objects.add_entries({key: [50, 1, 0]})
+
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(
+            list(
+                PaymentDailyRollup.objects.filter(date=today).values_list(
+                    "amount", "payment_count"
+                )
+            ),
+            [(150, 2)],
+        )
+
+    def test_receipt_joining_subscription_moves_offer(self):
+        subscription = Subscription.objects.create(
+            gateway_id="rollup", profile=self.profile
+        )
+        self.create_payment(subscription=subscription)
+        settled = {"status": PurchaseStatus.SETTLED}
+        self.assertEqual(self.get_rollup_totals(offer=None, **settled)["amount"], 81786)
+
+        receipt = Receipt.objects.create(
+            profile=self.profile, order_item=OrderItem.objects.get(pk=4)
+        )
+        receipt.subscription = subscription
+        receipt.save()
+
+        self.assertEqual(self.get_rollup_totals(offer=None, **settled)["amount"], 81686)
+        self.assertEqual(self.get_rollup_totals(offer=4, **settled)["amount"], 100)
+
+    def test_unchanged_receipt_skips_query(self):
+        receipt = Receipt.objects.get(pk=1)
+        receipt.end_date = timezone.now()
+        previous_query = 'SELECT "vendor_receipt"."subscription_id" AS "subscription"'
+
+        with CaptureQueriesContext(connection) as queries:
+            receipt.save()
+
+        self.assertFalse(
+            [
+                query
+                for query in queries.captured_queries
+                if query["sql"].startswith(previous_query)
+            ]
+        )
+
+    def test_dashboard_reads_rollups(self):
+        self.create_payment()
+        self.client.force_login(User.objects.get(pk=1))
+
+        response = self.client.get(reverse("vendor_admin:manager-dashboard"))
+
+        self.assertEqual(
+            response.context["settled_totals"],
+            [{"currency": "usd", "month": 100, "year": 100}],
+        )
@@ -1,7 +1,190 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.utils import timezone
+
+from vendor.models import Offer, Price
+from vendor.pricing import get_current_prices, get_price_cache_key, price_memo
 
 
 class ModelPriceTests(TestCase):
 
+    fixtures = ["user", "unit_test"]
+
+    def setUp(self):
+        self.hamster_wheel = Offer.objects.get(pk=3)
+        self.offers = Offer.objects.filter(pk__in=[1, 2, 3, 6])
+
+    def test_current_for_picks_highest_priority(self):
+        current_prices = Price.objects.current_for(self.offers)
+
+        self.assertEqual(current_prices[self.hamster_wheel.pk].pk, 5)
+        self.assertEqual(current_prices[6].cost, 1000)
+
+    def test_current_for_skips_offers_without_currency_price(self):
+        current_prices = Price.objects.current_for(self.offers, currency="usd")
+
+        self.assertNotIn(2, current_prices)
+
+    def test_current_for_single_query(self):
+        with self.assertNumQueries(1):
+            Price.objects.current_for([1, 2, 3, 6])
+
+    def test_current_for_ignores_expired_prices(self):
+        Price.objects.filter(pk=5).update(end_date=timezone.now())
+
+        current_prices = Price.objects.current_for(
+            [self.hamster_wheel], at=timezone.now() + timezone.timedelta(days=1)
+        )
+
+        self.assertEqual(current_prices[self.hamster_wheel.pk].pk, 4)
+
+    def test_current_for_fallback_matches_window_function(self):
+        window_prices = Price.objects.current_for(Offer.objects.all())
+
+        with mock.patch.object(connection.features, "supports_over_clause", False):
+            fallback_prices = Price.objects.current_for(Offer.objects.all())
+
+        self.assertEqual(window_prices, fallback_prices)
+
+    def test_next_transitions(self):
+        now = timezone.now()
+        starts = now + timezone.timedelta(days=3)
+        ends = now + timezone.timedelta(days=5)
+        Price.objects.create(
+            offer=self.hamster_wheel, cost=100, start_date=starts, end_date=ends
+        )
+
+        transitions = Price.objects.next_transitions(self.offers, at=now)
+
+        self.assertEqual(transitions[self.hamster_wheel.pk], starts)
+        self.assertNotIn(1, transitions)
+
+    def test_current_price_matches_current_for(self):
+        for offer in Offer.objects.all():
+            price = Price.objects.current_for([offer]).get(offer.pk)
+            self.assertEqual(offer.get_current_price_object(), price)
+
+
+class PriceMemoTests(TestCase):
+
+    fixtures = ["user", "unit_test"]
+
     def setUp(self):
-        pass
+        self.hamster_wheel = Offer.objects.get(pk=3)
+
+    def test_price_memo_reuses_prices(self):
+        with price_memo():
+            get_current_prices(Offer.objects.all())
+
+            with self.assertNumQueries(0):
+                self.hamster_wheel.current_price()
+                self.hamster_wheel.get_current_price_instance()
+
+    def test_price_memo_forgets_saved_prices(self):
+        with price_memo():
+            self.assertEqual(self.hamster_wheel.current_price(), 2520)
+
+            Price.objects.create(
+                offer=self.hamster_wheel,
+                cost=1000,
+                currency="usd",
+                start_date=timezone.now() - timezone.timedelta(days=1),
+                priority=10,
+            )
+
+            self.assertEqual(self.hamster_wheel.current_price(), 1000)
+
+    def test_no_memo_outside_block(self):
+        self.hamster_wheel.current_price()
+
+        with self.assertNumQueries(1):
+            self.hamster_wheel.get_current_price_object()
+
+    def test_product_current_price_shares_memo(self):
+        product = self.hamster_wheel.products.first()
+
+        with price_memo():
+            offer = product.get_current_offer()
+            get_current_prices([offer])
+
+            with self.assertNumQueries(1):  # Only the current offer lookup
+                product.get_current_price()
+
+
+@mock.patch("vendor.cache.VENDOR_CACHE_ALIAS", "default")
+class PriceCacheTests(TestCase):
+
+    fixtures = ["user", "unit_test"]
+
+    def setUp(self):
+        cache.clear()
+        self.hamster_wheel = Offer.objects.get(pk=3)
+
+    def test_cached_prices_skip_database(self):
+        offers = list(Offer.objects.all())
+        get_current_prices(offers)
+
+        with self.assertNumQueries(0):
+            prices = get_current_prices(offers)
+
+        self.assertEqual(prices[self.hamster_wheel.pk].pk, 5)
+
+    def test_cache_expires_at_next_price_change(self):
+        now = timezone.now()
+        sale_start = now + timezone.timedelta(hours=1)
+        Price.objects.create(
+            offer=self.hamster_wheel, cost=100, start_date=sale_start, priority=10
+        )
+
+        with mock.patch(
+            "django.core.cache.backends.locmem.LocMemCache.set_many"
+        ) as set_many:
+            with mock.patch("vendor.pricing.timezone.now", return_value=now):
+                get_current_prices([self.hamster_wheel])
+
+        entries, timeout = set_many.call_args.args
+        self.assertEqual(timeout, 3600)
+        self.assertEqual(
+            entries[get_price_cache_key(self.hamster_wheel.pk)]["usd"][1], sale_start
+        )
+
+    def test_scheduled_price_takes_effect(self):
+        sale_start = timezone.now() + timezone.timedelta(hours=1)
+        Price.objects.create(
+            offer=self.hamster_wheel, cost=100, start_date=sale_start, priority=10
+        )
+        self.assertEqual(self.hamster_wheel.current_price(), 2520)
+
+        later = sale_start + timezone.timedelta(minutes=1)
+        with mock.patch("vendor.pricing.timezone.now", return_value=later):
+            with mock.patch("vendor.models.price.timezone.now", return_value=later):
+                self.assertEqual(self.hamster_wheel.current_price(), 100)
+
+    def test_price_save_clears_cache(self):
+        self.assertEqual(self.hamster_wheel.current_price(), 2520)
+
+        price = Price.objects.get(pk=5)
+        price.cost = 2000
+        price.save()
+
+        self.assertEqual(self.hamster_wheel.current_price(), 2000)
+
+    def test_offer_save_clears_cache(self):
+        get_current_prices([self.hamster_wheel])
+
+        self.hamster_wheel.save()
+
+        self.assertIsNone(cache.get(get_price_cache_key(self.hamster_wheel.pk)))
+
+    def test_offer_without_price_is_cached(self):
+        offer = Offer.objects.create(
+            name="No Price", site_id=1, start_date=timezone.now()
+        )
+
+        get_current_prices([offer])
+
+        with self.assertNumQueries(0):
+            self.assertIsNone(get_current_prices([offer])[offer.pk])
@@ -141,6 +141,50 @@ class ModelProductTests(TestCase):
         receipt.save()
         self.assertIn(CustomerProfile.objects.get(pk=1), product.expired_owners())
 
+    def test_get_owners_is_queryset(self):
+        product = Product.objects.get(pk=2)
+
+        with self.assertNumQueries(1):
+            owners = list(product.get_owners())
+
+        self.assertEqual(owners, [CustomerProfile.objects.get(pk=1)])
+        self.assertFalse(product.get_expired_owners().exists())
+
+    def test_get_expired_owners_excludes_current_owners(self):
+        product = Product.objects.get(pk=2)
+        receipt = Receipt.objects.get(pk=2)
+        receipt.end_date = timezone.now() - timezone.timedelta(days=1)
+        receipt.save()
+
+        self.assertFalse(product.get_owners().exists())
+        self.assertEqual(
+            list(product.get_expired_owners()), [CustomerProfile.objects.get(pk=1)]
+        )
+        self.assertEqual(
+            [profile.pk for profile in product.iter_expired_owners(chunk_size=1)], [1]
+        )
+
+    def test_iter_owners(self):
+        product = Product.objects.get(pk=2)
+
+        self.assertEqual([profile.pk for profile in product.iter_owners()], [1])
+
+    def test_get_owner_counts(self):
+        other_profile = CustomerProfile.objects.create(
+            user=User.objects.get(pk=2), site=Site.objects.get(pk=1)
+        )
+        receipt = Receipt.objects.create(
+            profile=other_profile,
+            order_item=Receipt.objects.get(pk=2).order_item,
+            start_date=timezone.now() - timezone.timedelta(days=1),
+        )
+        receipt.products.add(Product.objects.get(pk=2), Product.objects.get(pk=3))
+
+        with self.assertNumQueries(1):
+            owner_counts = Product.get_owner_counts(Product.objects.all())
+
+        self.assertEqual(owner_counts, {2: 2, 3: 1})
+
     def test_save_autocreate_sku_successs(self):
         site = Site.objects.get(pk=1)
         product_1 = Product.objects.create(name="Test Product", site=site)
@@ -1,10 +1,19 @@
+import csv
+import io
 from datetime import timedelta
 
+from django.contrib.auth import get_user_model
 from django.contrib.sites.models import Site
-from django.test import TestCase
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 from django.utils import timezone as dj_timezone
 
-from vendor.models import CustomerProfile, Invoice, Offer, Receipt
+from vendor.models import CustomerProfile, Invoice, Offer, Payment, Receipt
+from vendor.models.choice import InvoiceStatus
+
+User = get_user_model()
 
 
 class ReceiptModelTests(TestCase):
@@ -16,6 +25,7 @@ class ReceiptModelTests(TestCase):
         self.new_invoice = Invoice.objects.create(
             profile=CustomerProfile.objects.get(pk=1),
             site=Site.objects.get(pk=1),
+            status=InvoiceStatus.COMPLETE,
         )
         self.new_invoice.add_offer(Offer.objects.get(pk=4))
         self.new_receipt = Receipt.objects.create(
@@ -62,3 +72,57 @@ class ReceiptViewTests(TestCase):
     def test_view_receipt_status_code(self):
         # TODO: Implement Test
         pass
+
+
+class ReceiptListCSVTests(TestCase):
+
+    fixtures = ["user", "unit_test"]
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(User.objects.get(pk=1))
+        Payment.objects.get(pk=1).record_refund(
+            100, dj_timezone.now(), reason="duplicate"
+        )
+
+    def get_rows(self):
+        response = self.client.post(reverse("vendor_admin:manager-receipt-download"))
+
+        with CaptureQueriesContext(connection) as queries:
+            content = b"".join(response.streaming_content).decode()
+
+        return list(csv.reader(io.StringIO(content))), len(queries)
+
+    def test_rows_have_refunds(self):
+        rows, query_count = self.get_rows()
+        header, row = rows[0], rows[1]
+
+        self.assertEqual(len(rows), Receipt.objects.count() + 1)
+        self.assertEqual(row[header.index("Order ID")], "1")
+        self.assertEqual(row[header.index("Refund ID")], "1-1-1")
+        self.assertEqual(row[header.index("Refund Total")], "100")
+        self.assertEqual(row[header.index("Refund Reason")], "Duplicate")
+
+    def test_refund_id_once_per_payment(self):
+        Payment.objects.get(pk=1).record_refund(50, dj_timezone.now())
+
+        rows, query_count = self.get_rows()
+        header, row = rows[0], rows[1]
+
+        self.assertEqual(row[header.index("Refund ID")], "1-1-1")
+        self.assertEqual(row[header.index("Refund Amounts")], "100 50")
+        self.assertEqual(row[header.index("Refund Total")], "150")
+
+    def test_query_count_does_not_grow_with_receipts(self):
+        rows, query_count = self.get_rows()
+        receipt = Receipt.objects.get(pk=3)
+
+        for index in range(3):
+            receipt.pk = None
+            receipt.uuid = None
+            receipt.save()
+
+        more_rows, more_query_count = self.get_rows()
+
+        self.assertEqual(len(more_rows), len(rows) + 3)
+        self.assertEqual(more_query_count, query_count)
@@ -3,6 +3,8 @@ from types import SimpleNamespace
 from django.contrib.sites.models import Site
 from django.test import TestCase
 
+from vendor.models import CustomerProfile, Invoice, Offer
+from vendor.models.choice import InvoiceStatus
 from vendor.processors.stripe import StripeProcessor, StripeQueryBuilder
 
 
@@ -44,3 +46,21 @@ class StripeProcessorHelperTests(TestCase):
 
     def test_get_stripe_connect_account_default_none(self):
         self.assertIsNone(self.processor.get_stripe_connect_account())
+
+    def test_draft_stripe_invoice_with_open_cart(self):
+        customer_profile = CustomerProfile.objects.get(pk=1)
+        cart = customer_profile.get_cart()
+        stripe_invoice = SimpleNamespace(
+            id="in_draft", status="draft", created=1600000000, total=1500
+        )
+
+        invoice, created = self.processor.get_or_create_invoice_from_stripe_invoice(
+            stripe_invoice, Offer.objects.get(pk=4), customer_profile
+        )
+
+        self.assertTrue(created)
+        self.assertNotEqual(invoice.pk, cart.pk)
+        self.assertEqual(invoice.status, InvoiceStatus.DRAFT)
+        self.assertEqual(Invoice.objects.get(pk=invoice.pk).total, 15)
+        self.assertEqual(customer_profile.get_cart(), cart)
+        self.assertEqual(Invoice.objects.get(pk=cart.pk).order_items.count(), 4)
@@ -42,6 +42,26 @@ class ModelSubscriptionTests(TestCase):
         # TODO: Finish this test
         pass
 
+    def test_with_receipts_skips_receipt_queries(self):
+        profile_name = str(self.customer_profile_existing)
+        subscription = Subscription.objects.with_receipts().get(pk=1)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(str(subscription), "Hulk Mug Subscription")
+            self.assertEqual(subscription.get_offer().pk, 4)
+            self.assertIsNone(subscription.get_next_billing_date())
+            self.assertEqual(str(subscription.profile), profile_name)
+
+    def test_with_receipts_matches_queried_values(self):
+        subscription = Subscription.objects.get(pk=1)
+        prefetched = Subscription.objects.with_receipts().get(pk=1)
+
+        self.assertEqual(str(prefetched), str(subscription))
+        self.assertEqual(prefetched.get_total(), subscription.get_total())
+        self.assertEqual(
+            prefetched.get_next_billing_date(), subscription.get_next_billing_date()
+        )
+
 
 class SubscriptionViewTests(TestCase):
 